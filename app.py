@@ -1,9 +1,19 @@
 import streamlit as st
 import pandas as pd
 import requests
+import requests.adapters
+import orjson
 import re
-import base64
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # Oldal beállítások
 st.set_page_config(
@@ -13,112 +23,301 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Session state inicializálás
-if 'players' not in st.session_state:
-    st.session_state.players = []
+# Előzmények tárolása: egy közös mappa, benne session-önként egy almappa
+_HISTORY_ROOT = os.path.join(tempfile.gettempdir(), "wcl_attendance")
+_HISTORY_MAX_AGE = 24 * 60 * 60  # másodperc
 
-if 'attendance_records' not in st.session_state:
-    st.session_state.attendance_records = []
+def _new_history_dir():
+    """Létrehozza az új session mappáját, és törli a lejárt session mappákat"""
+    os.makedirs(_HISTORY_ROOT, exist_ok=True)
+    cutoff = time.time() - _HISTORY_MAX_AGE
+    with os.scandir(_HISTORY_ROOT) as entries:
+        for entry in entries:
+            try:
+                expired = entry.is_dir() and entry.stat().st_mtime < cutoff
+            except FileNotFoundError:
+                # Egy párhuzamosan induló session már törölte
+                continue
+            if expired:
+                shutil.rmtree(entry.path, ignore_errors=True)
+    return tempfile.mkdtemp(dir=_HISTORY_ROOT)
+
+def _touch_history_dir():
+    """Életben tartja a session mappáját, hogy a takarítás ne törölje (szükség esetén újra létrehozza)"""
+    os.makedirs(st.session_state.history_dir, exist_ok=True)
+    os.utime(st.session_state.history_dir)
+
+# Session state inicializálás (csak a session első futásakor)
+if 'initialized' not in st.session_state:
+    st.session_state.update({
+        # Játékos név -> make_player(...) eredménye, rekord azonosító -> rekord
+        'players': {},
+        'attendance_records': {},
+        # Az utolsó beküldött elemzés (forrás, résztvevők, report leírás)
+        'analysis': None,
+        # Az előzmények táblái Parquet fájlokban, session-önként külön mappában
+        'history_dir': _new_history_dir(),
+        'initialized': True
+    })
 
 # Helper függvények
+_REPORT_ID_RE = re.compile(r'reports/([A-Za-z0-9]+)')
+
+_WCL_API_URL = 'https://www.warcraftlogs.com/api/v2/client'
+
+# Egyszerre futó WCL kérések felső határa (a rate limit tiszteletben tartása)
+_WCL_MAX_CONCURRENCY = 8
+
+class WCLQueryError(Exception):
+    """A Warcraft Logs API által visszaadott lekérdezési hiba"""
+
 def extract_report_id(url):
     """Kinyeri a report ID-t a Warcraft Logs URL-ből"""
-    match = re.search(r'reports\/([a-zA-Z0-9]+)', url)
+    match = _REPORT_ID_RE.search(url)
     return match.group(1) if match else None
 
-def get_participants_from_log(report_id):
-    """Lekéri a résztvevőket a Warcraft Logs API-ról"""
-    if not st.secrets.get("WCL_API_KEY"):
-        st.error("Warcraft Logs API kulcs nincs beállítva!")
-        return [], None, None
-    
-    query = f"""
-    {{
-        reportData {{
-            report(code: "{report_id}") {{
-                masterData(translate: true) {{
-                    actors(type: "player") {{
-                        name
-                        subType
-                    }}
-                }}
-                startTime
-                title
-                zone {{
+@st.cache_resource
+def _wcl_session(api_key):
+    """Újrahasznosítható HTTP session a Warcraft Logs API-hoz (keep-alive kapcsolatok)"""
+    session = requests.Session()
+    session.headers.update({'Authorization': f'Bearer {api_key}'})
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=_WCL_MAX_CONCURRENCY)
+    session.mount('https://', adapter)
+    return session
+
+@st.cache_resource
+def _wcl_semaphore():
+    """Az összes session között megosztott korlát a párhuzamos WCL kérésekre"""
+    return threading.BoundedSemaphore(_WCL_MAX_CONCURRENCY)
+
+# Konstans, paraméterezett lekérdezések (a report kód változóként megy át)
+_PLAYERS_QUERY = """
+query ($code: String) {
+    reportData {
+        report(code: $code) {
+            masterData {
+                actors(type: "player") {
                     name
-                }}
-            }}
-        }}
-    }}
-    """
+                    subType
+                }
+            }
+        }
+    }
+}
+"""
+
+# Egy reporthoz a játékosok és a leírás egyetlen kérésben
+_REPORT_QUERY = """
+query ($code: String) {
+    reportData {
+        report(code: $code) {
+            masterData {
+                actors(type: "player") {
+                    name
+                    subType
+                }
+            }
+            startTime
+            title
+            zone {
+                name
+            }
+        }
+    }
+}
+"""
+
+def _query_report(query, report_id, api_key):
+    """Lefuttat egy report lekérdezést a Warcraft Logs API-n"""
+    with _wcl_semaphore():
+        response = _wcl_session(api_key).post(
+            _WCL_API_URL,
+            json={'query': query, 'variables': {'code': report_id}},
+            timeout=15
+        )
+    data = orjson.loads(response.content)
+    
+    # Hibás válasz esetén kivételt dobunk, így az nem kerül a gyorsítótárba
+    if 'errors' in data:
+        raise WCLQueryError(data['errors'][0]['message'])
+    
+    return data['data']['reportData']['report']
+
+def _parse_players(report):
+    """A report játékos karakterei kisbetűs, duplikátummentes halmazként"""
+    actors = report['masterData']['actors']
+    return frozenset(actor['name'].lower() for actor in actors if actor['subType'] == 'Human')
+
+def _format_report_info(report):
+    """A report leírása (cím, zóna, kezdési idő)"""
+    start_time = datetime.utcfromtimestamp(report['startTime']/1000).strftime('%Y-%m-%d %H:%M')
+    title = report['title']
+    zone = report['zone']['name'] if report['zone'] else "Ismeretlen"
+    info = f"{zone} - {start_time}"
+    return f"{title} - {info}" if title else info
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_players(report_id, api_key):
+    """Lekéri a report játékos karaktereit (gyorsítótárazva)"""
+    return _parse_players(_query_report(_PLAYERS_QUERY, report_id, api_key))
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_report(report_id, api_key):
+    """Lekéri a report játékosait és leírását egy kérésben (gyorsítótárazva)"""
+    report = _query_report(_REPORT_QUERY, report_id, api_key)
+    return _parse_players(report), _format_report_info(report)
+
+def _call_wcl(fetch, report_id, default):
+    """Meghív egy gyorsítótárazott WCL lekérést, a hibákat a felületen jeleníti meg"""
+    api_key = st.secrets.get("WCL_API_KEY")
+    if not api_key:
+        st.error("Warcraft Logs API kulcs nincs beállítva!")
+        return default
     
     try:
         with st.spinner("Adatok lekérése a Warcraft Logs-ról..."):
-            response = requests.post(
-                'https://www.warcraftlogs.com/api/v2/client',
-                json={'query': query},
-                headers={'Authorization': f'Bearer {st.secrets["WCL_API_KEY"]}'},
-                timeout=15
-            )
-            data = response.json()
-        
-        if 'errors' in data:
-            st.error(f"Hiba a lekérdezés során: {data['errors'][0]['message']}")
-            return [], None, None
-        
-        report = data['data']['reportData']['report']
-        actors = report['masterData']['actors']
-        players = [actor['name'] for actor in actors if actor['subType'] == 'Human']
-        
-        # Report adatok
-        start_time = datetime.utcfromtimestamp(report['startTime']/1000).strftime('%Y-%m-%d %H:%M')
-        title = report['title']
-        zone = report['zone']['name'] if report['zone'] else "Ismeretlen"
-        
-        return players, title, f"{zone} - {start_time}"
+            return fetch(report_id, api_key)
+    
+    except WCLQueryError as e:
+        st.error(f"Hiba a lekérdezés során: {e}")
+        return default
     
     except Exception as e:
         st.error(f"Hiba történt: {str(e)}")
-        return [], None, None
+        return default
+
+def get_participants_from_log(report_id):
+    """Lekéri a résztvevőket és a report leírását a Warcraft Logs API-ról"""
+    return _call_wcl(_fetch_report, report_id, (frozenset(), ""))
+
+def get_participants_from_logs(report_ids):
+    """Párhuzamosan lekéri több report résztvevőit, és egyesíti őket
+    
+    Visszaadja az egyesített résztvevőhalmazt és a sikeresen lekért report ID-kat.
+    """
+    api_key = st.secrets.get("WCL_API_KEY")
+    if not api_key:
+        st.error("Warcraft Logs API kulcs nincs beállítva!")
+        return frozenset(), []
+    
+    ctx = get_script_run_ctx()
+    
+    def fetch(report_id):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return _fetch_players(report_id, api_key)
+    
+    results = []
+    fetched_ids = []
+    with st.spinner(f"{len(report_ids)} report lekérése a Warcraft Logs-ról..."):
+        with ThreadPoolExecutor(max_workers=_WCL_MAX_CONCURRENCY) as executor:
+            futures = {report_id: executor.submit(fetch, report_id) for report_id in report_ids}
+            for report_id, future in futures.items():
+                try:
+                    results.append(future.result())
+                    fetched_ids.append(report_id)
+                except WCLQueryError as e:
+                    st.error(f"Hiba a lekérdezés során ({report_id}): {e}")
+                except Exception as e:
+                    st.error(f"Hiba történt ({report_id}): {str(e)}")
+    
+    return frozenset().union(*results), fetched_ids
+
+def _remove_record_file(record):
+    """Törli a rekordhoz tartozó Parquet fájlt"""
+    try:
+        os.remove(record['path'])
+    except FileNotFoundError:
+        pass
+
+def save_attendance_record(df, source):
+    """Parquet fájlba menti az eredménytáblát, a session_state csak a rekord indexét tárolja"""
+    # Egyedi azonosító: az időbélyeg csak perc pontosságú, nem lehet kulcs
+    record_id = uuid.uuid4().hex
+    _touch_history_dir()
+    path = os.path.join(st.session_state.history_dir, f"{record_id}.parquet")
+    df.to_parquet(path, compression='zstd', index=False)
+    
+    st.session_state.attendance_records[record_id] = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "source": source,
+        "path": path
+    }
+
+def make_player(char_list):
+    """Összeállítja a játékos bejegyzését, a kisbetűs és összefűzött karakterneveket előre kiszámolva"""
+    return {
+        "characters": char_list,
+        "characters_lc": [c.lower() for c in char_list],
+        "characters_str": ", ".join(char_list)
+    }
 
 def check_attendance(participants):
-    """Ellenőrzi a részvételt a játékosok listája alapján"""
+    """Ellenőrzi a részvételt a játékosok listája alapján
+    
+    A participants kisbetűs karakternevek halmaza (frozenset).
+    """
     attendance = []
     
-    for player in st.session_state.players:
-        player_name = player['name']
+    for player_name, player in st.session_state.players.items():
         characters = player['characters']
-        attended_chars = []
-        
-        for char in characters:
-            # Nagybetű/kisbetű érzékenység elkerülése
-            if any(char.lower() == p.lower() for p in participants):
-                attended_chars.append(char)
+        # Nagybetű/kisbetű érzékenység elkerülése (a kisbetűs nevek már bevitelkor elkészülnek)
+        attended_chars = [c for c, c_lc in zip(characters, player['characters_lc'])
+                          if c_lc in participants]
+        count = len(attended_chars)
         
         attendance.append({
             'player': player_name,
             'characters': characters,
-            'attended': len(attended_chars) > 0,
+            'characters_str': player['characters_str'],
+            'attended': count > 0,
             'attended_chars': attended_chars,
-            'count': len(attended_chars)
+            'count': count
         })
     
     return attendance
 
-def to_csv_download_link(df, filename):
-    """Generál egy CSV letöltési linket"""
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    href = f'<a href="data:file/csv;base64,{b64}" download="{filename}">📥 {filename} letöltése</a>'
-    return href
+def to_csv_bytes(df):
+    """CSV tartalom előállítása bájtokként a letöltés gombhoz"""
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False, encoding='utf-8')
+    return buf.getvalue()
 
 # UI Komponensek
+def _delete_player(name):
+    """Törlés gomb callback: eltávolítja a játékost a listából"""
+    del st.session_state.players[name]
+
+def _import_roster():
+    """Feltöltés callback: beolvassa a roster CSV-t"""
+    uploaded_file = st.session_state.roster_upload
+    if uploaded_file is None:
+        return
+    
+    try:
+        df_import = pd.read_csv(uploaded_file)
+        # Konvertálás: minden karakterlista stringként van, listává kell alakítani
+        if {'name', 'characters'} <= set(df_import.columns):
+            # A darabolás és a szóközök levágása vektorizált, csak az üres elemek szűrése soronkénti
+            characters = (df_import['characters'].fillna('').astype(str).str.strip()
+                          .str.split(r'\s*,\s*', regex=True))
+            characters = characters.apply(lambda chars: [c for c in chars if c])
+            st.session_state.players = {
+                name: make_player(chars)
+                for name, chars in zip(df_import['name'].astype(str), characters)
+            }
+            st.session_state.roster_import_msg = (
+                "success", f"{len(st.session_state.players)} játékos importálva!"
+            )
+    except Exception as e:
+        st.session_state.roster_import_msg = ("error", f"Hiba történt az importálás során: {str(e)}")
+
+@st.fragment
 def player_management_section():
-    """Játékoskezelő szekció"""
-    st.sidebar.header("⚔️ Játékosok kezelése")
+    """Játékoskezelő szekció (a sidebarban, önállóan újrafutó fragmentként)"""
+    st.header("⚔️ Játékosok kezelése")
     
     # Új játékos hozzáadása
-    with st.sidebar.expander("➕ Új játékos hozzáadása", expanded=True):
+    with st.expander("➕ Új játékos hozzáadása", expanded=True):
         with st.form("player_form", clear_on_submit=True):
             player_name = st.text_input("Játékos neve")
             characters = st.text_input("Karakterek (vesszővel elválasztva)", 
@@ -128,54 +327,50 @@ def player_management_section():
             if submitted:
                 if player_name and characters:
                     char_list = [c.strip() for c in characters.split(",") if c.strip()]
-                    st.session_state.players.append({
-                        "name": player_name,
-                        "characters": char_list
-                    })
-                    st.sidebar.success(f"{player_name} hozzáadva!")
+                    st.session_state.players[player_name] = make_player(char_list)
+                    st.success(f"{player_name} hozzáadva!")
                 else:
-                    st.sidebar.error("Add meg a játékos nevét és legalább egy karakterét!")
+                    st.error("Add meg a játékos nevét és legalább egy karakterét!")
     
     # Játékosok listája
-    st.sidebar.subheader("Játékosok listája")
+    st.subheader("Játékosok listája")
     
     if not st.session_state.players:
-        st.sidebar.info("Nincsenek játékosok a listában. Adj hozzá új játékosokat!")
+        st.info("Nincsenek játékosok a listában. Adj hozzá új játékosokat!")
     else:
-        for i, player in enumerate(st.session_state.players):
-            cols = st.sidebar.columns([4, 1])
+        for player_name, player in st.session_state.players.items():
+            cols = st.columns([4, 1])
             with cols[0]:
-                st.markdown(f"**{player['name']}**")
-                st.caption(", ".join(player['characters']))
+                st.markdown(f"**{player_name}**")
+                st.caption(player['characters_str'])
             with cols[1]:
-                if st.button("🗑️", key=f"delete_{i}"):
-                    st.session_state.players.pop(i)
-                    st.experimental_rerun()
+                st.button("🗑️", key=f"delete_{player_name}",
+                          on_click=_delete_player, args=(player_name,))
     
     # Import/Export
-    st.sidebar.subheader("Adatkezelés")
+    st.subheader("Adatkezelés")
     
     # Export jelenlegi roster CSV-be
     if st.session_state.players:
-        df_roster = pd.DataFrame(st.session_state.players)
-        st.sidebar.markdown(to_csv_download_link(df_roster, 'wcl_roster.csv'), 
-                           unsafe_allow_html=True)
+        df_roster = pd.DataFrame([
+            {"name": name, "characters": player['characters_str']}
+            for name, player in st.session_state.players.items()
+        ])
+        st.download_button("📥 wcl_roster.csv letöltése",
+                           data=to_csv_bytes(df_roster),
+                           file_name='wcl_roster.csv',
+                           mime='text/csv')
     
     # Import CSV-ből
-    uploaded_file = st.sidebar.file_uploader("Roster importálása CSV-ből", type="csv")
-    if uploaded_file is not None:
-        try:
-            df_import = pd.read_csv(uploaded_file)
-            # Konvertálás: minden karakterlista stringként van, listává kell alakítani
-            if 'characters' in df_import.columns:
-                df_import['characters'] = df_import['characters'].apply(
-                    lambda x: [c.strip() for c in str(x).split(",") if c.strip()]
-                )
-                st.session_state.players = df_import.to_dict('records')
-                st.sidebar.success(f"{len(df_import)} játékos importálva!")
-                st.experimental_rerun()
-        except Exception as e:
-            st.sidebar.error(f"Hiba történt az importálás során: {str(e)}")
+    st.file_uploader("Roster importálása CSV-ből", type="csv",
+                     key="roster_upload", on_change=_import_roster)
+    
+    if 'roster_import_msg' in st.session_state:
+        kind, message = st.session_state.pop('roster_import_msg')
+        if kind == "success":
+            st.success(message)
+        else:
+            st.error(message)
 
 def log_analysis_section():
     """Log elemző szekció"""
@@ -183,35 +378,75 @@ def log_analysis_section():
     
     # Adatforrás választás
     source = st.radio("Adatforrás", 
-                      ["Warcraft Logs Report", "Kézi karakterlista"],
+                      ["Warcraft Logs Report", "Több Warcraft Logs Report", "Kézi karakterlista"],
                       horizontal=True)
     
-    participants = []
+    participants = frozenset()
     report_info = ""
+    no_api_key = not st.secrets.get("WCL_API_KEY")
     
+    # Az űrlapok miatt a számítás csak beküldéskor fut le, gépelés közben nem
     if source == "Warcraft Logs Report":
-        report_link = st.text_input("Warcraft Logs Report Link", 
-                                   placeholder="https://www.warcraftlogs.com/reports/...")
+        with st.form("wcl_report"):
+            report_link = st.text_input("Warcraft Logs Report Link", 
+                                       placeholder="https://www.warcraftlogs.com/reports/...")
+            submitted = st.form_submit_button("Résztvevők lekérése", disabled=no_api_key)
         
-        if report_link:
+        if submitted and report_link:
             report_id = extract_report_id(report_link)
             if report_id:
                 st.info(f"Report ID: `{report_id}`")
+                participants, info = get_participants_from_log(report_id)
                 
-                if st.button("Résztvevők lekérése", disabled=not st.secrets.get("WCL_API_KEY")):
-                    participants, title, info = get_participants_from_log(report_id)
-                    
-                    if participants:
-                        st.success(f"{len(participants)} résztvevő található a logban!")
-                        report_info = f"{title} - {info}" if title else info
+                if participants:
+                    st.success(f"{len(participants)} résztvevő található a logban!")
+                    report_info = info
             else:
                 st.error("Érvénytelen link! A linknek tartalmaznia kell a report kódot.")
+    elif source == "Több Warcraft Logs Report":
+        with st.form("wcl_reports"):
+            report_links = st.text_area("Warcraft Logs Report linkek (soronként egy)", 
+                                       placeholder="https://www.warcraftlogs.com/reports/...",
+                                       height=150)
+            submitted = st.form_submit_button("Résztvevők lekérése", disabled=no_api_key)
+        
+        if submitted and report_links:
+            links = [line.strip() for line in report_links.splitlines() if line.strip()]
+            invalid = [link for link in links if not extract_report_id(link)]
+            # Duplikátumok kiszűrése a sorrend megtartásával
+            report_ids = list(dict.fromkeys(filter(None, map(extract_report_id, links))))
+            
+            if invalid:
+                st.error(f"Érvénytelen link(ek): {', '.join(invalid)}")
+            
+            if report_ids:
+                st.info(f"Report ID-k: `{'`, `'.join(report_ids)}`")
+                participants, fetched_ids = get_participants_from_logs(report_ids)
+                
+                if participants:
+                    st.success(f"{len(participants)} résztvevő található a logokban!")
+                    # Csak a sikeresen lekért reportok kerülnek a leírásba
+                    report_info = f"{len(fetched_ids)} report: {', '.join(fetched_ids)}"
     else:
-        char_input = st.text_area("Karakterek (vesszővel elválasztva)", 
-                                 placeholder="Arthas, Illidan, Jaina, Sylvanas...",
-                                 height=100)
-        if char_input:
-            participants = [c.strip() for c in char_input.split(",") if c.strip()]
+        with st.form("manual_input"):
+            char_input = st.text_area("Karakterek (vesszővel elválasztva)", 
+                                     placeholder="Arthas, Illidan, Jaina, Sylvanas...",
+                                     height=100)
+            submitted = st.form_submit_button("Számítás")
+        
+        if submitted and char_input:
+            participants = frozenset(c.strip().lower() for c in char_input.split(",") if c.strip())
+    
+    # Beküldéskor az eredmény a session_state-be kerül, így a későbbi újrafutásokat is túléli
+    if submitted:
+        st.session_state.analysis = {
+            "source": source,
+            "participants": participants,
+            "report_info": report_info
+        }
+    elif st.session_state.analysis and st.session_state.analysis['source'] == source:
+        participants = st.session_state.analysis['participants']
+        report_info = st.session_state.analysis['report_info']
     
     # Ha vannak résztvevők, akkor részvétel számítása
     if participants:
@@ -224,56 +459,68 @@ def log_analysis_section():
         attendance = check_attendance(participants)
         
         # Eredmények megjelenítése
-        results = []
-        for a in attendance:
-            attended_chars = ", ".join(a['attended_chars']) if a['attended_chars'] else "-"
-            results.append({
-                "Játékos": a['player'],
-                "Karakterek": ", ".join(a['characters']),
-                "Részt vett": "Igen" if a['attended'] else "Nem",
-                "Részt vevő karakterek": attended_chars,
-                "Karakterek száma": len(a['attended_chars'])
-            })
-        
-        df_results = pd.DataFrame(results)
+        df_results = pd.DataFrame({
+            "Játékos": [a['player'] for a in attendance],
+            "Karakterek": [a['characters_str'] for a in attendance],
+            "Részt vett": pd.Categorical(
+                ["Igen" if a['attended'] else "Nem" for a in attendance],
+                categories=["Igen", "Nem"]
+            ),
+            "Részt vevő karakterek": [", ".join(a['attended_chars']) if a['attended_chars'] else "-"
+                                      for a in attendance],
+            "Karakterek száma": [a['count'] for a in attendance]
+        })
+        # Kisebb memóriaigényű típusok a megjelenítéshez, exporthoz és mentéshez
+        df_results = df_results.astype({
+            "Játékos": "category",
+            "Részt vett": "category",
+            "Karakterek száma": "uint8"
+        })
         
         # Színezés
-        def color_attended(row):
-            colors = [''] * len(row)
-            if row['Részt vett'] == 'Igen':
-                colors[2] = 'background-color: #2e7d32; color: white;'
-            else:
-                colors[2] = 'background-color: #c62828; color: white;'
-            return colors
+        def color_attended(df):
+            styles = pd.DataFrame('', index=df.index, columns=df.columns)
+            mask = df['Részt vett'].to_numpy() == 'Igen'
+            styles.loc[mask, 'Részt vett'] = 'background-color: #2e7d32; color: white;'
+            styles.loc[~mask, 'Részt vett'] = 'background-color: #c62828; color: white;'
+            return styles
         
-        styled_df = df_results.style.apply(color_attended, axis=1)
+        styled_df = df_results.style.apply(color_attended, axis=None)
         st.dataframe(styled_df, use_container_width=True, height=600)
         
-        # Részvételi adatok mentése
-        st.session_state.attendance_records.append({
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
-            "source": report_info if report_info else "Kézi bevite",
-            "results": results
-        })
+        # Részvételi adatok mentése (csak a beküldéskor, nem minden újrafutáskor)
+        if submitted:
+            save_attendance_record(df_results, report_info if report_info else "Kézi bevite")
         
         # Export gomb
-        st.markdown(to_csv_download_link(df_results, 'wcl_attendance.csv'), 
-                   unsafe_allow_html=True)
+        st.download_button("📥 wcl_attendance.csv letöltése",
+                           data=to_csv_bytes(df_results),
+                           file_name='wcl_attendance.csv',
+                           mime='text/csv')
+
+def _delete_record(record_id):
+    """Törlés gomb callback: eltávolítja a rekordot az előzményekből"""
+    _remove_record_file(st.session_state.attendance_records.pop(record_id))
 
+@st.fragment
 def history_section():
-    """Előzmények szekció"""
+    """Előzmények szekció (önállóan újrafutó fragment)"""
     if st.session_state.attendance_records:
         st.header("🕒 Előzmények")
+        _touch_history_dir()
         
-        for record in reversed(st.session_state.attendance_records):
+        for record_id, record in reversed(st.session_state.attendance_records.items()):
             with st.expander(f"{record['timestamp']} - {record['source']}"):
-                df_record = pd.DataFrame(record['results'])
-                st.dataframe(df_record, use_container_width=True)
+                # A tábla csak kérésre töltődik be, a be nem nyitott rekordok nem olvasnak fájlt
+                if st.toggle("Táblázat megjelenítése", key=f"show_record_{record_id}"):
+                    try:
+                        st.dataframe(pd.read_parquet(record['path']), use_container_width=True)
+                    except FileNotFoundError:
+                        st.warning("A rekord adatai már nem érhetők el.")
                 
                 # Törlés gomb
-                if st.button("Törlés", key=f"delete_record_{record['timestamp']}"):
-                    st.session_state.attendance_records.remove(record)
-                    st.experimental_rerun()
+                st.button("Törlés", key=f"delete_record_{record_id}",
+                          on_click=_delete_record, args=(record_id,))
 
 def user_guide_section():
     """Használati útmutató szekció"""
@@ -314,7 +561,8 @@ def main():
     st.markdown("Kövesd nyomon a raidjeidet és a játékosok részvételét")
     
     # Szekciók
-    player_management_section()
+    with st.sidebar:
+        player_management_section()
     log_analysis_section()
     history_section()
     user_guide_section()